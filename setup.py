@@ -10,13 +10,15 @@ setup(
     author_email='e.tenezakis@gmail.com',
     description='validating downscaleCMIP6',
     install_requires=[
-        "xclim @ git+https://github.com/ClimateImpactLab/xclim@63023d27f89a457c752568ffcec2e9ce9ad7a81a",
         "matplotlib",
         "xarray",
         "gcsfs",
         "numpy",
         "matplotlib",
         "cartopy",
+        "numba",
+        "flox",
+        "numbagg",
         "pytest",
         "black",
         "nc-time-axis",
@@ -1,5 +1,4 @@
 import numpy as np
-import pytest
 from urbanspoon.tests.conftest import (
     time_series_factory,
     spatio_temporal_gcm_factory,
@@ -16,7 +15,7 @@ def test_xr_quantile_across_time_by_cell():
     pick_cells = [(-90., -180.), (90., 180.)]
     actual = core.xr_quantiles_across_time_by_cell(da=fakedata, q=[0.1, 0.2], cells=pick_cells)
     for c in pick_cells:
-        assert actual[c].sel(quantile=0.1).values.item() == 10.9
+        assert actual.sel(cell=c, quantile=0.1).values.item() == 10.9
 
 def test_xr_average_across_days_of_year():
 
@@ -71,7 +70,22 @@ def test_xr_collapse_across_space():
     np.testing.assert_almost_equal(expected, actual.values.item())
 
 
-@pytest.mark.skip(reason="unimplemented")
+def test_xr_collapse_across_space_with_nan():
+    fakedata = spatial_gcm_factory(
+        x=np.array([[1.0, np.nan], [3.0, 4.0]]), lat=np.array([1, 2]), lon=np.array([1, 2])
+    )
+    num = (
+        1 * np.cos(1 * np.pi / 180.0)
+        + 3 * np.cos(1 * np.pi / 180.0)
+        + 4 * np.cos(2 * np.pi / 180.0)
+    )
+    den = np.cos(1 * np.pi / 180.0) * 2 + np.cos(2 * np.pi / 180.0)
+    expected = num / den
+    actual = core.xr_collapse_across_space(fakedata)
+    assert actual.shape == ()
+    np.testing.assert_almost_equal(expected, actual.values.item())
+
+
 def test_xr_collapse_to_global_time_series():
 
     fakedata = spatio_temporal_gcm_factory(
@@ -84,7 +98,6 @@ def test_xr_collapse_to_global_time_series():
     assert actual.values[0] == 2.5
 
 
-@pytest.mark.skip(reason="unimplemented")
 def test_xr_count_across_days_of_year():
 
     fakedata = time_series_factory(x=np.arange(1, 366))
@@ -94,18 +107,24 @@ def test_xr_count_across_days_of_year():
     assert result.values.item() == expected
 
 
-@pytest.mark.skip(reason="unimplemented")
 def test_xc_maximum_consecutive_dry_days():
 
-    # TODO
-    raise NotImplementedError
+    x = np.ones(365)
+    x[10:15] = 0.0
+    fakedata = time_series_factory(x=x)
+    result = core.xc_maximum_consecutive_dry_days(fakedata, thresh=0.5)
+    assert len(result.dims) == 1 and result.dims[0] == "year"
+    assert result.values.item() == 5
 
 
-@pytest.mark.skip(reason="unimplemented")
 def test_xc_rx5day():
 
-    # TODO
-    raise NotImplementedError
+    x = np.ones(365)
+    x[100] = 10.0
+    fakedata = time_series_factory(x=x)
+    result = core.xc_rx5day(fakedata)
+    assert len(result.dims) == 1 and result.dims[0] == "year"
+    assert result.values.item() == 14.0
 
 
 def test_plot_colored_maps():
@@ -136,4 +155,9 @@ def test_plot_colored_timeseries():
         },
     }
 
-    core.plot_colored_timeseries(da=fakedata, title="sometitle", units="someunits")
+    lines = core.plot_colored_timeseries(
+        da=fakedata, title="sometitle", units="someunits"
+    )
+    core.plot_colored_timeseries(
+        da=fakedata, title="sometitle", units="someunits", lines=lines
+    )